@@ -0,0 +1,30 @@
+import os
+import multiprocessing
+
+# -------------------------
+# Gunicorn + UvicornWorker: one event loop, Vision channel and OpenAI pool per worker process
+# -------------------------
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = max(1, int(os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count()))
+# Workers inherit the environment: main.py sizes its image pool from this same count
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+timeout = 60                    # OCR + LLM (with retries) must finish well inside this
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to cap slow memory growth from image buffers
+max_requests = 1000
+max_requests_jitter = 100
+
+# No preload_app: clients, the gRPC channel and the image pool must be created after fork
+preload_app = False
+
+# Merged over gunicorn's default dictConfig. Raising root to INFO lets app logs (e.g. the
+# per-call cached_tokens usage line) through; gunicorn's own loggers are left as they are.
+logconfig_dict = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "root": {"level": os.getenv("LOG_LEVEL", "INFO"), "handlers": ["console"]},
+}
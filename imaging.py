@@ -0,0 +1,37 @@
+import io
+import os
+
+from PIL import Image, ImageOps
+
+# -------------------------
+# Image preprocessing for OCR
+# Kept free of app imports: process-pool children unpickle resize_and_encode by importing
+# this module, so it must stay as light as Pillow itself.
+# -------------------------
+OCR_MAX_EDGE = int(os.getenv("OCR_MAX_EDGE", "1600"))          # OCR quality plateaus well below phone-camera size
+OCR_JPEG_QUALITY = int(os.getenv("OCR_JPEG_QUALITY", "80"))
+
+def resize_and_encode(image_bytes: bytes) -> bytes:
+    """
+    Downscales to OCR_MAX_EDGE and re-encodes as JPEG to shrink the Vision payload.
+    Returns the original bytes if Pillow can't decode them or re-encoding wouldn't help.
+    """
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        resized = max(img.size) > OCR_MAX_EDGE
+        # JPEGs decode straight at a reduced scale instead of full 8-12 MP
+        img.draft("RGB", (OCR_MAX_EDGE, OCR_MAX_EDGE))
+        img.thumbnail((OCR_MAX_EDGE, OCR_MAX_EDGE), Image.LANCZOS)
+        # Rotate the small image, not the full-resolution one (the bounding box is square)
+        img = ImageOps.exif_transpose(img)
+    except Exception:
+        return image_bytes
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=OCR_JPEG_QUALITY, optimize=True)
+    encoded = buf.getvalue()
+    return encoded if resized or len(encoded) < len(image_bytes) else image_bytes
+
+def warm_up() -> None:
+    """No-op job submitted at startup so pool processes are spawned before the first upload."""
@@ -1,18 +1,75 @@
 import os
-import json
-from typing import List, Optional
+import re
+import hashlib
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, ValidationError
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 from google.cloud import vision
 from google.cloud.vision_v1.types.image_annotator import AnnotateImageRequest
-from openai import OpenAI
+import openai
+from openai import AsyncOpenAI
+from google.api_core import exceptions as gexc
+from tenacity import retry, retry_if_exception, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+from imaging import resize_and_encode, warm_up as warm_up_image_worker
+import httpx
+import msgpack
+import tiktoken
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# -------------------------
+# Request size limits
+# -------------------------
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 << 20)))
+MAX_BATCH_FILES = 16                                            # one Vision batch_annotate_images call
+MULTIPART_OVERHEAD_BYTES = 64 << 10                             # boundaries, headers, form fields
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+MAX_BATCH_REQUEST_BYTES = MAX_REQUEST_BYTES * MAX_BATCH_FILES
+BATCH_UPLOAD_PATHS = {"/scan-batch", "/scan-async"}
+
+class SizeGuardMiddleware:
+    """
+    Pure ASGI middleware that rejects oversized bodies from Content-Length alone, before any
+    bytes are read. read_upload still enforces the per-file cap for chunked uploads.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limit = MAX_BATCH_REQUEST_BYTES if scope["path"] in BATCH_UPLOAD_PATHS else MAX_REQUEST_BYTES
+        raw_length = next((value for key, value in scope["headers"] if key == b"content-length"), b"0")
+        try:
+            content_length = int(raw_length)
+        except ValueError:
+            response = ORJSONResponse({"detail": "Invalid Content-Length header."}, status_code=400)
+        else:
+            if content_length <= limit:
+                await self.app(scope, receive, send)
+                return
+            response = ORJSONResponse({"detail": "Uploaded file is too large."}, status_code=413)
+        await response(scope, receive, send)
 
 # -------------------------
 # App & CORS
 # -------------------------
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+# Added before CORS so CORS stays outermost and the guard's 413/400 still carry CORS headers
+app.add_middleware(SizeGuardMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],            # tighten to your app domains later
@@ -31,28 +88,194 @@ class ParsedItem(BaseModel):
 
 ParsedItems = List[ParsedItem]
 
+# Compiled once; validates one receipt's items from a model reply in a single pydantic-core call.
+# Cache hits skip it (see _decode_items): entries were validated before they were written.
+PARSED_ITEMS_ADAPTER = TypeAdapter(ParsedItems)
+# Model output: receipt key ("items", or "1".."n" when coalesced) -> raw items, validated per receipt
+MODEL_REPLY_ADAPTER = TypeAdapter(Dict[str, Any])
+
+class BatchScan(BaseModel):
+    results: Dict[str, ParsedItems] = Field(default_factory=dict, description="Receipt index -> items")
+    errors: Dict[str, str] = Field(default_factory=dict, description="Receipt index -> error detail")
+
+class BatchJob(BatchScan):
+    batch_id: str
+    status: str
+
 # -------------------------
 # Clients (lazy init)
 # -------------------------
-_vision_client: Optional[vision.ImageAnnotatorClient] = None
-_openai_client: Optional[OpenAI] = None
+_vision_client: Optional[vision.ImageAnnotatorAsyncClient] = None
+_openai_client: Optional[AsyncOpenAI] = None
 
-def vision_client() -> vision.ImageAnnotatorClient:
+# One pooled, keep-alive HTTP client per worker so OpenAI calls skip the TLS handshake
+OPENAI_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60)
+
+def vision_client() -> vision.ImageAnnotatorAsyncClient:
     global _vision_client
     if _vision_client is None:
         # GOOGLE_APPLICATION_CREDENTIALS must be set (Render: Secret File)
-        _vision_client = vision.ImageAnnotatorClient()
+        _vision_client = vision.ImageAnnotatorAsyncClient()
     return _vision_client
 
-def openai_client() -> OpenAI:
+def openai_client() -> AsyncOpenAI:
     global _openai_client
     if _openai_client is None:
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY is not set.")
-        _openai_client = OpenAI(api_key=api_key)
+        _openai_client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(limits=OPENAI_HTTP_LIMITS, timeout=httpx.Timeout(60.0, connect=5.0)),
+        )
     return _openai_client
 
+@app.on_event("startup")
+async def warm_clients():
+    """
+    Builds both clients and opens the Vision gRPC channel at boot so the first
+    requests after a cold start don't pay the handshake. Failures are non-fatal;
+    requests fall back to lazy init and surface the real error.
+    """
+    try:
+        channel = vision_client().transport.grpc_channel
+        await asyncio.wait_for(channel.channel_ready(), timeout=5)
+    except Exception as exc:
+        logger.warning("Vision client warm-up failed: %s", exc)
+    try:
+        openai_client()
+    except Exception as exc:
+        logger.warning("OpenAI client warm-up failed: %s", exc)
+
+@app.on_event("shutdown")
+async def close_clients():
+    global _vision_client, _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+    if _vision_client is not None:
+        await _vision_client.transport.close()
+    _vision_client = None
+    _openai_client = None
+
+# -------------------------
+# Retries (jittered exponential backoff on rate limits / transient 5xx)
+# -------------------------
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "4"))
+RETRY_MAX_WAIT = 8.0
+VISION_TIMEOUT_SECONDS = float(os.getenv("VISION_TIMEOUT_SECONDS", "30"))
+
+_backoff = wait_exponential_jitter(initial=0.2, max=RETRY_MAX_WAIT)
+
+def _log_retry(retry_state) -> None:
+    exc = retry_state.outcome.exception()
+    logger.warning(
+        "retrying provider call: fn=%s attempt=%d wait=%.2fs error=%s",
+        retry_state.fn.__name__,
+        retry_state.attempt_number,
+        retry_state.next_action.sleep,
+        type(exc).__name__,
+    )
+
+def _is_retryable_openai(exc: BaseException) -> bool:
+    if isinstance(exc, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+def _openai_wait(retry_state) -> float:
+    # Honor Retry-After when OpenAI sends one, otherwise fall back to jittered backoff
+    response = getattr(retry_state.outcome.exception(), "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(retry_after), RETRY_MAX_WAIT)
+    except (TypeError, ValueError):
+        return _backoff(retry_state)
+
+@retry(
+    retry=retry_if_exception_type((gexc.ResourceExhausted, gexc.ServiceUnavailable)),
+    wait=_backoff,
+    stop=stop_after_attempt(RETRY_ATTEMPTS),
+    before_sleep=_log_retry,
+    reraise=True,
+)
+async def annotate_images(requests: List[AnnotateImageRequest]):
+    # retry=None: the GAPIC default retry (600 s deadline) would compound with ours
+    return await vision_client().batch_annotate_images(
+        requests=requests, retry=None, timeout=VISION_TIMEOUT_SECONDS
+    )
+
+@retry(
+    retry=retry_if_exception(_is_retryable_openai),
+    wait=_openai_wait,
+    stop=stop_after_attempt(RETRY_ATTEMPTS),
+    before_sleep=_log_retry,
+    reraise=True,
+)
+async def create_chat_completion(**kwargs):
+    # SDK retries stay on for the Batch API/file calls; only this call retries via tenacity
+    return await openai_client().with_options(max_retries=0).chat.completions.create(**kwargs)
+
+# -------------------------
+# Result cache (Redis, optional: disabled unless REDIS_URL is set)
+# -------------------------
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(30 * 86400)))
+# Short socket timeouts: a blackholed Redis must degrade to a cache miss, not stall the scan
+REDIS_TIMEOUT_SECONDS = float(os.getenv("REDIS_TIMEOUT_SECONDS", "0.25"))
+
+_redis_client: Optional[Redis] = None
+
+def redis_client() -> Optional[Redis]:
+    global _redis_client
+    if _redis_client is None:
+        url = os.getenv("REDIS_URL")
+        if not url:
+            return None
+        _redis_client = Redis.from_url(
+            url, socket_timeout=REDIS_TIMEOUT_SECONDS, socket_connect_timeout=REDIS_TIMEOUT_SECONDS
+        )
+    return _redis_client
+
+def _cache_key(prefix: str, payload: bytes) -> str:
+    return f"{prefix}:{hashlib.sha256(payload).hexdigest()}"
+
+async def _cache_get(key: str) -> Optional[bytes]:
+    client = redis_client()
+    if client is None:
+        return None
+    try:
+        return await client.get(key)
+    except RedisError as exc:
+        # A cache outage must never fail a scan
+        logger.warning("Redis GET %s failed: %s", key, exc)
+        return None
+
+async def _cache_set(key: str, value: bytes) -> None:
+    client = redis_client()
+    if client is None:
+        return
+    try:
+        await client.set(key, value, ex=CACHE_TTL_SECONDS)
+    except RedisError as exc:
+        logger.warning("Redis SET %s failed: %s", key, exc)
+
+async def get_or_compute(key: str, compute, encode, decode):
+    """
+    Returns decode(cached value) on a hit; otherwise awaits compute(), caches encode(result)
+    and returns it.
+    """
+    hit = await _cache_get(key)
+    if hit is not None:
+        return decode(hit)
+    value = await compute()
+    await _cache_set(key, encode(value))
+    return value
+
+@app.on_event("shutdown")
+async def close_redis():
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+    _redis_client = None
+
 # -------------------------
 # Health / root
 # -------------------------
@@ -62,97 +285,654 @@ def root():
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    # pid lets a probe confirm requests are spread across all gunicorn workers
+    return {"status": "ok", "pid": os.getpid()}
 
 # -------------------------
 # OCR helper
 # -------------------------
-def ocr_image_bytes(image_bytes: bytes) -> str:
-    """
-    Uses Google Cloud Vision to extract full text from a receipt image.
-    Returns a single string with the OCR text.
-    """
-    client = vision_client()
-    request = AnnotateImageRequest(
+VISION_MAX_BATCH = 16                                           # Vision's per-call image limit
+SCAN_BATCH_CONCURRENCY = int(os.getenv("SCAN_BATCH_CONCURRENCY", "8"))
+# Split the cores between gunicorn workers so N workers x pool size doesn't oversubscribe.
+# gunicorn.conf.py exports the worker count it chose; a bare uvicorn process counts as one.
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY") or 1))
+IMAGE_POOL_WORKERS = int(os.getenv("IMAGE_POOL_WORKERS", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+IMAGE_POOL_MIN_BYTES = 200 * 1024                               # below this, IPC costs more than the GIL
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+def image_pool() -> ProcessPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        # spawn, not fork: forking after the gRPC channel is up is unsafe
+        _image_pool = ProcessPoolExecutor(
+            max_workers=IMAGE_POOL_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _image_pool
+
+@app.on_event("startup")
+async def warm_image_pool():
+    # Spawn every pool process now rather than on the first large upload (spawned lazily, one per job)
+    loop = asyncio.get_running_loop()
+    pool = image_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, warm_up_image_worker) for _ in range(IMAGE_POOL_WORKERS)))
+
+@app.on_event("shutdown")
+async def close_image_pool():
+    global _image_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+    _image_pool = None
+
+async def prepare_image(image_bytes: bytes) -> bytes:
+    # Pillow work is CPU-bound; large images go to the process pool, small ones to a thread
+    executor = image_pool() if len(image_bytes) >= IMAGE_POOL_MIN_BYTES else None
+    return await asyncio.get_running_loop().run_in_executor(executor, resize_and_encode, image_bytes)
+
+def _ocr_request(image_bytes: bytes) -> AnnotateImageRequest:
+    return AnnotateImageRequest(
         image=vision.Image(content=image_bytes),
         features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
     )
-    resp = client.annotate_image(request=request)
+
+def _ocr_text(resp) -> str:
     if resp.error.message:
         raise RuntimeError(f"Vision API error: {resp.error.message}")
     return resp.full_text_annotation.text if resp.full_text_annotation else ""
 
+async def ocr_image_bytes(image_bytes: bytes) -> str:
+    """
+    Uses Google Cloud Vision to extract full text from a receipt image.
+    Returns a single string with the OCR text.
+    """
+    async def compute() -> str:
+        prepared = await prepare_image(image_bytes)
+        # The async client has no annotate_image helper; a one-element batch is the same RPC.
+        batch = await annotate_images([_ocr_request(prepared)])
+        return _ocr_text(batch.responses[0])
+
+    return await get_or_compute(
+        _cache_key("ocr", image_bytes), compute, lambda t: t.encode("utf-8"), lambda b: b.decode("utf-8")
+    )
+
+async def ocr_images_bytes(images: List[bytes]) -> List[Union[str, HTTPException]]:
+    """
+    OCRs several receipt images with as few Vision RPCs as possible (up to 16 images each).
+    Returns, per image and in input order, either its OCR text or the HTTPException it failed with.
+    """
+    keys = [_cache_key("ocr", b) for b in images]
+    hits = await asyncio.gather(*(_cache_get(k) for k in keys))
+    texts: List[Union[str, HTTPException]] = [hit.decode("utf-8") if hit is not None else "" for hit in hits]
+    misses = [i for i, hit in enumerate(hits) if hit is None]
+    if not misses:
+        return texts
+
+    # Only cache misses go to Vision, a bounded number of RPCs at a time
+    sem = asyncio.Semaphore(SCAN_BATCH_CONCURRENCY)
+
+    async def annotate_chunk(chunk: List[int]):
+        async with sem:
+            prepared = await asyncio.gather(*(prepare_image(images[i]) for i in chunk))
+            return await annotate_images([_ocr_request(b) for b in prepared])
+
+    chunks = [misses[i : i + VISION_MAX_BATCH] for i in range(0, len(misses), VISION_MAX_BATCH)]
+    batches = await asyncio.gather(*(annotate_chunk(chunk) for chunk in chunks), return_exceptions=True)
+    for chunk, batch in zip(chunks, batches):
+        if isinstance(batch, Exception):
+            logger.warning("Vision batch of %d images failed: %r", len(chunk), batch)
+            for i in chunk:
+                texts[i] = HTTPException(status_code=502, detail="Vision API request failed.")
+            continue
+        for i, resp in zip(chunk, batch.responses):
+            try:
+                texts[i] = _ocr_text(resp)
+            except RuntimeError as exc:
+                texts[i] = HTTPException(status_code=502, detail=str(exc))
+
+    await asyncio.gather(*(
+        _cache_set(keys[i], texts[i].encode("utf-8")) for i in misses if isinstance(texts[i], str)
+    ))
+    return texts
+
 # -------------------------
 # Prompt for the parser
 # -------------------------
-SYSTEM_PROMPT = """You are a precise receipt parser. You read raw OCR text from a grocery/retail receipt.
-Extract only real purchasable line items. Exclude totals, tax, discounts, store headers/addresses, dates,
-barcodes, membership lines, and payment lines.
-
-Return a compact JSON array where each element has:
-- name: normalized product name (e.g., "Chicken Breast", "Bananas", "Paper Towels")
-- quantity: integer (>=1). If the line implies a pack/weight count like "x2", "2 CT", or a quantity in
-  parentheses, use that. If absent, default to 1.
-- category: "Food" or "Household" (food/produce/meat/dairy/frozen/snacks = Food; paper goods/cleaners/
-  toiletries/laundry/foil/bags/detergent = Household).
+# Keep this constant and first in every call: OpenAI's prompt cache keys on the exact prefix.
+# Never format request data into it.
+SYSTEM_PROMPT = """Parse raw OCR text from a grocery/retail receipt into purchasable line items.
+Skip totals, tax, discounts, store headers/addresses, dates, barcodes, membership and payment lines.
 
-Output STRICT JSON only. No comments, no code fences, no extra keys.
+Return {"items": [...]}; each item has:
+- name: normalized product name (e.g. "Chicken Breast", "Bananas", "Paper Towels")
+- quantity: integer >= 1 taken from "x2", "2 CT" or a parenthesized count; default 1.
+- category: "Food" (produce/meat/dairy/frozen/snacks) or "Household" (paper goods/cleaners/toiletries/
+  laundry/foil/bags/detergent).
 """
 
 USER_PROMPT_TEMPLATE = """OCR_TEXT:
 {ocr_text}
 """
 
+# Appended (not prepended) so coalesced calls share the single-receipt prompt prefix.
+BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + """
+You will receive several receipts, each introduced by "RECEIPT <id>:". Return a JSON object mapping
+every id (as a string) to that receipt's items array, e.g. {"1": [...], "2": [...]}.
+"""
+
+BATCH_RECEIPT_TEMPLATE = """RECEIPT {receipt_id}:
+{ocr_text}
+"""
+
 # -------------------------
 # Parsing helper (OpenAI)
 # -------------------------
-def parse_items_with_openai(ocr_text: str) -> ParsedItems:
-    client = openai_client()
+PARSE_BATCH_MAX_SIZE = int(os.getenv("PARSE_BATCH_MAX_SIZE", "8"))
+PARSE_BATCH_MAX_WAIT = float(os.getenv("PARSE_BATCH_MAX_WAIT_MS", "50")) / 1000
+# Receipt JSON rarely exceeds ~800 tokens; a tight cap bounds decode time on runaway output
+OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "1024"))
 
-    # Use Chat Completions for broad compatibility
-    resp = client.chat.completions.create(
-        model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": USER_PROMPT_TEMPLATE.format(ocr_text=ocr_text)},
-        ],
-        temperature=0,
-    )
+# Strict structured outputs need an object root and closed objects. Written out by hand and kept
+# to keywords every model (incl. fine-tunes) supports: no pattern/minimum; quantity >= 1 is
+# enforced by PARSED_ITEMS_ADAPTER instead.
+_ITEM_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "quantity": {"type": "integer"},
+        "category": {"type": "string", "enum": ["Food", "Household"]},
+    },
+    "required": ["name", "quantity", "category"],
+    "additionalProperties": False,
+}
 
-    content = resp.choices[0].message.content if resp.choices else "[]"
+def _response_format(keys: List[str]) -> dict:
+    items_schema = {"type": "array", "items": _ITEM_JSON_SCHEMA}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "parsed_receipts",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {key: items_schema for key in keys},
+                "required": keys,
+                "additionalProperties": False,
+            },
+        },
+    }
 
-    # Extract JSON safely
-    try:
-        data = json.loads(content)
-    except json.JSONDecodeError:
-        # Try to find the first JSON array in the content
-        start = content.find("[")
-        end = content.rfind("]")
-        if start != -1 and end != -1 and end > start:
-            data = json.loads(content[start : end + 1])
-        else:
-            raise HTTPException(status_code=502, detail="Model did not return valid JSON.")
+SINGLE_RESPONSE_FORMAT = _response_format(["items"])
+
+def _chat_request(
+    system_prompt: str, user_prompt: str, response_format: dict, max_tokens: int = OPENAI_MAX_TOKENS
+) -> dict:
+    # Shared by live calls and Batch API JSONL lines so both parse identically.
+    # OPENAI_MODEL is the swap point for a smaller model or a fine-tune ID.
+    return {
+        "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        "temperature": 0,
+        "top_p": 1,
+        "max_tokens": max_tokens,
+        "response_format": response_format,
+    }
 
-    # Validate with Pydantic
+async def _complete(
+    system_prompt: str, user_prompt: str, response_format: dict, max_tokens: int = OPENAI_MAX_TOKENS
+) -> str:
+    # Use Chat Completions for broad compatibility
+    resp = await create_chat_completion(**_chat_request(system_prompt, user_prompt, response_format, max_tokens))
+    if resp.usage is not None:
+        details = resp.usage.prompt_tokens_details
+        logger.info(
+            "OpenAI usage: prompt_tokens=%d cached_tokens=%d completion_tokens=%d",
+            resp.usage.prompt_tokens,
+            details.cached_tokens if details and details.cached_tokens else 0,
+            resp.usage.completion_tokens,
+        )
+    if not resp.choices:
+        return ""
+    if resp.choices[0].finish_reason == "length":
+        raise HTTPException(status_code=502, detail="Model output was truncated.")
+    return resp.choices[0].message.content
+
+def _load_reply(content: Optional[str]) -> Dict[str, Any]:
+    # Schema-guided output is plain JSON; a refusal or empty reply comes back without content
+    if not content:
+        raise HTTPException(status_code=502, detail="Model did not return valid JSON.")
     try:
-        items = [ParsedItem(**item) for item in data]
-    except ValidationError as ve:
-        raise HTTPException(status_code=422, detail=f"Parsed JSON validation failed: {ve}")
+        return MODEL_REPLY_ADAPTER.validate_json(content)
+    except ValidationError:
+        raise HTTPException(status_code=502, detail="Model did not return valid JSON.")
 
+def _require_items(items: Optional[ParsedItems]) -> ParsedItems:
     # Ensure at least something parsed
     if not items:
         raise HTTPException(status_code=204, detail="No items parsed from receipt.")
     return items
 
+def _validate_items(data: Any) -> ParsedItems:
+    # Validate one receipt's items so a bad receipt only fails its own caller
+    if not data:
+        return _require_items(None)
+    try:
+        items = PARSED_ITEMS_ADAPTER.validate_python(data)
+    except ValidationError as ve:
+        raise HTTPException(status_code=422, detail=f"Parsed JSON validation failed: {ve}")
+    return _require_items(items)
+
+async def _parse_one(ocr_text: str) -> ParsedItems:
+    content = await _complete(SYSTEM_PROMPT, USER_PROMPT_TEMPLATE.format(ocr_text=ocr_text), SINGLE_RESPONSE_FORMAT)
+    return _validate_items(_load_reply(content).get("items"))
+
+async def _parse_many(ocr_texts: List[str]) -> list:
+    """
+    Parses several receipts with a single LLM call.
+    Returns, per receipt, either its ParsedItems or the HTTPException it failed with.
+    """
+    user_prompt = "\n".join(
+        BATCH_RECEIPT_TEMPLATE.format(receipt_id=i, ocr_text=text)
+        for i, text in enumerate(ocr_texts, start=1)
+    )
+    keys = [str(i) for i in range(1, len(ocr_texts) + 1)]
+    content = await _complete(
+        BATCH_SYSTEM_PROMPT, user_prompt, _response_format(keys), OPENAI_MAX_TOKENS * len(keys)
+    )
+    data = _load_reply(content)
+
+    results = []
+    for key in keys:
+        try:
+            results.append(_validate_items(data.get(key)))
+        except HTTPException as exc:
+            results.append(exc)
+    return results
+
+# Dynamic batcher: concurrent parse requests arriving within PARSE_BATCH_MAX_WAIT share one LLM call.
+# Receipts are binned by OCR token count (one queue per bin) so short receipts aren't
+# bundled with long ones; anything past the last bound is parsed on its own.
+PARSE_BIN_TOKEN_BOUNDS = (300, 1200, 4000)
+
+_parse_queues: List[asyncio.Queue] = []
+_parse_batcher_tasks: List[asyncio.Task] = []
+_parse_dispatch_tasks: set = set()
+_encoding: Optional[tiktoken.Encoding] = None
+
+def _load_encoding() -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(os.getenv("OPENAI_MODEL", "gpt-4o-mini"))
+    except KeyError:                        # e.g. fine-tune IDs tiktoken doesn't know
+        return tiktoken.get_encoding("o200k_base")
+
+@app.on_event("startup")
+async def load_encoding():
+    # First load may download the BPE file; keep it off the loop and out of the request path
+    global _encoding
+    try:
+        _encoding = await asyncio.get_running_loop().run_in_executor(None, _load_encoding)
+    except Exception as exc:
+        logger.warning("tiktoken encoding unavailable, estimating token counts: %s", exc)
+
+def _count_tokens(text: str) -> int:
+    if _encoding is None:                   # not loaded: ~4 chars/token is close enough for binning
+        return len(text) // 4
+    return len(_encoding.encode(text, disallowed_special=()))
+
+def _parse_bin(ocr_text: str) -> Optional[int]:
+    tokens = _count_tokens(ocr_text)
+    for i, bound in enumerate(PARSE_BIN_TOKEN_BOUNDS):
+        if tokens < bound:
+            return i
+    return None
+
+async def _dispatch_parse_batch(batch: list) -> None:
+    texts = [text for text, _ in batch]
+    futures = [fut for _, fut in batch]
+    try:
+        if len(texts) == 1:
+            results = [await _parse_one(texts[0])]
+        else:
+            results = await _parse_many(texts)
+    except Exception as exc:
+        results = [exc] * len(futures)
+
+    for fut, result in zip(futures, results):
+        if fut.done():                      # caller went away
+            continue
+        if isinstance(result, Exception):
+            fut.set_exception(result)
+        else:
+            fut.set_result(result)
+
+async def _run_parse_batcher(queue: asyncio.Queue) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + PARSE_BATCH_MAX_WAIT
+        while len(batch) < PARSE_BATCH_MAX_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # Dispatch without awaiting so the next batch can fill while this one is in flight
+        task = asyncio.create_task(_dispatch_parse_batch(batch))
+        _parse_dispatch_tasks.add(task)
+        task.add_done_callback(_parse_dispatch_tasks.discard)
+
+@app.on_event("startup")
+async def start_parse_batcher():
+    global _parse_queues, _parse_batcher_tasks
+    if PARSE_BATCH_MAX_SIZE > 1:
+        _parse_queues = [asyncio.Queue() for _ in PARSE_BIN_TOKEN_BOUNDS]
+        _parse_batcher_tasks = [asyncio.create_task(_run_parse_batcher(q)) for q in _parse_queues]
+
+@app.on_event("shutdown")
+async def stop_parse_batcher():
+    global _parse_queues, _parse_batcher_tasks
+    for task in _parse_batcher_tasks:
+        task.cancel()
+    _parse_queues = []
+    _parse_batcher_tasks = []
+
+async def _parse_batched(ocr_text: str) -> ParsedItems:
+    if not _parse_queues:                   # batching disabled (or app not started)
+        return await _parse_one(ocr_text)
+    bin_index = _parse_bin(ocr_text)
+    if bin_index is None:                   # too long to share a call
+        return await _parse_one(ocr_text)
+    fut = asyncio.get_running_loop().create_future()
+    await _parse_queues[bin_index].put((ocr_text, fut))
+    return await fut
+
+# Cached items are msgpack rows of (name, quantity, category): no per-item field names.
+# Bump the version whenever that layout changes so stale entries are never decoded.
+PARSE_CACHE_PREFIX = "parse:v2"
+
+def _encode_items(items: ParsedItems) -> bytes:
+    return msgpack.packb([(item.name, item.quantity, item.category) for item in items])
+
+def _decode_items(blob: bytes) -> ParsedItems:
+    # Validated before it was cached; skip re-validation on the hit path
+    return [
+        ParsedItem.model_construct(name=name, quantity=quantity, category=category)
+        for name, quantity, category in msgpack.unpackb(blob)
+    ]
+
+# Anything that changes the model's answer for the same OCR text must be part of the key
+_PARSE_CONFIG_DIGEST = hashlib.sha256(
+    orjson.dumps([SYSTEM_PROMPT, BATCH_SYSTEM_PROMPT, SINGLE_RESPONSE_FORMAT], option=orjson.OPT_SORT_KEYS)
+).hexdigest()[:16]
+
+def _parse_cache_key(ocr_text: str) -> str:
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    return _cache_key(f"{PARSE_CACHE_PREFIX}:{model}:{_PARSE_CONFIG_DIGEST}", ocr_text.encode("utf-8"))
+
+# A price like "3.99" / "3,99" or a currency symbol
+_PRICE_RE = re.compile(r"[$€£¥]|\d+[.,]\d{2}")
+NOT_A_RECEIPT_DETAIL = "Image doesn't appear to contain a receipt."
+
+def is_probably_receipt(ocr_text: str) -> bool:
+    """
+    Cheap gate in front of the LLM: blank, black or non-receipt photos OCR to
+    little text with few digits and no prices.
+    """
+    text = ocr_text.strip()
+    return (
+        len(text) >= 20
+        and sum(c.isdigit() for c in text) >= 5
+        and _PRICE_RE.search(text) is not None
+    )
+
+def require_receipt(ocr_text: str) -> None:
+    if not is_probably_receipt(ocr_text):
+        raise HTTPException(status_code=422, detail=NOT_A_RECEIPT_DETAIL)
+
+async def parse_items_with_openai(ocr_text: str) -> ParsedItems:
+    require_receipt(ocr_text)
+    return await get_or_compute(
+        _parse_cache_key(ocr_text),
+        lambda: _parse_batched(ocr_text),
+        _encode_items,
+        _decode_items,
+    )
+
+# -------------------------
+# Streaming parse (items emitted as the model writes them)
+# -------------------------
+class _ItemStreamParser:
+    """
+    Incremental scanner over the {"items": [...]} reply. feed() returns the raw JSON
+    of each item object completed so far, tracking strings so braces inside names are ignored.
+    """
+
+    def __init__(self) -> None:
+        self._buf: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> List[str]:
+        done = []
+        for ch in text:
+            if self._depth >= 3:                # inside an item object
+                self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if self._depth == 3:            # root object -> items array -> item
+                    self._buf = [ch]
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 2 and ch == "}":
+                    done.append("".join(self._buf))
+        return done
+
+async def stream_items_with_openai(ocr_text: str) -> AsyncIterator[ParsedItem]:
+    # Only opening the stream is retried; once items have been sent a retry would duplicate them
+    stream = await create_chat_completion(
+        **_chat_request(SYSTEM_PROMPT, USER_PROMPT_TEMPLATE.format(ocr_text=ocr_text), SINGLE_RESPONSE_FORMAT),
+        stream=True,
+    )
+    parser = _ItemStreamParser()
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            for raw in parser.feed(choice.delta.content or ""):
+                try:
+                    yield ParsedItem.model_validate_json(raw)
+                except ValidationError as ve:
+                    raise HTTPException(status_code=422, detail=f"Parsed JSON validation failed: {ve}")
+            if choice.finish_reason == "length":
+                raise HTTPException(status_code=502, detail="Model output was truncated.")
+    finally:
+        # Release the pooled connection on errors, early exit and client disconnects too
+        await stream.close()
+
+def _sse(data: str, event: Optional[str] = None) -> str:
+    return (f"event: {event}\n" if event else "") + f"data: {data}\n\n"
+
+def _sse_error(status_code: int, detail: str) -> str:
+    return _sse(orjson.dumps({"status_code": status_code, "detail": detail}).decode(), event="error")
+
+async def stream_item_events(ocr_text: str) -> AsyncIterator[str]:
+    """
+    Yields one SSE 'data' event per parsed item, then a 'done' event; a receipt with no
+    items gets a single 'empty' event instead. Failures after the response has started
+    are sent as an 'error' event carrying the usual status/detail.
+    """
+    key = _parse_cache_key(ocr_text)
+    try:
+        hit = await _cache_get(key)
+        if hit is not None:
+            items = _decode_items(hit)
+            for item in items:
+                yield _sse(item.model_dump_json())
+        else:
+            items = []
+            async with contextlib.aclosing(stream_items_with_openai(ocr_text)) as item_stream:
+                async for item in item_stream:
+                    items.append(item)
+                    yield _sse(item.model_dump_json())
+            if not items:
+                yield _sse(orjson.dumps({"detail": "No items parsed from receipt."}).decode(), event="empty")
+                return
+            await _cache_set(key, _encode_items(items))
+    except HTTPException as exc:
+        yield _sse_error(exc.status_code, exc.detail)
+        return
+    except (openai.APIError, httpx.HTTPError) as exc:
+        # Provider failures after retries, or the stream dropping mid-reply
+        logger.warning("Streaming parse failed: %r", exc)
+        yield _sse_error(502, "Model request failed.")
+        return
+    yield _sse("{}", event="done")
+
+# -------------------------
+# Deferred parsing (OpenAI Batch API, ~50% cheaper, up to 24h)
+# -------------------------
+OCR_FAILED_DETAIL = "Image could not be read by OCR."
+
+async def submit_parse_batch(ocr_texts: List[Union[str, HTTPException]]) -> BatchJob:
+    """
+    Queues one parse request per receipt-like OCR text. Images whose OCR failed or whose
+    text fails the receipt gate are not sent; they are reported in the job's errors, both
+    here and when polling (their indices are kept in the batch metadata).
+    """
+    client = openai_client()
+    ocr_failed = [str(i) for i, text in enumerate(ocr_texts) if isinstance(text, HTTPException)]
+    not_receipt = [
+        str(i) for i, text in enumerate(ocr_texts) if isinstance(text, str) and not is_probably_receipt(text)
+    ]
+    skipped = {**{i: OCR_FAILED_DETAIL for i in ocr_failed}, **{i: NOT_A_RECEIPT_DETAIL for i in not_receipt}}
+    if len(skipped) == len(ocr_texts):
+        raise HTTPException(status_code=422, detail="No uploaded image could be scanned as a receipt.")
+    lines = [
+        orjson.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": _chat_request(
+                SYSTEM_PROMPT, USER_PROMPT_TEMPLATE.format(ocr_text=text), SINGLE_RESPONSE_FORMAT
+            ),
+        })
+        for i, text in enumerate(ocr_texts)
+        if str(i) not in skipped
+    ]
+    input_file = await client.files.create(
+        file=("receipts.jsonl", b"\n".join(lines)),
+        purpose="batch",
+    )
+    batch = await client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        # At most 16 indices each, well within the 512-char metadata value limit
+        metadata={"ocr_failed": ",".join(ocr_failed), "not_receipt": ",".join(not_receipt)},
+    )
+    return BatchJob(batch_id=batch.id, status=batch.status, errors=skipped)
+
+def _skipped_from_metadata(metadata: Optional[Dict[str, str]]) -> Dict[str, str]:
+    metadata = metadata or {}
+    skipped = {}
+    for key, detail in (("ocr_failed", OCR_FAILED_DETAIL), ("not_receipt", NOT_A_RECEIPT_DETAIL)):
+        for receipt_id in filter(None, (metadata.get(key) or "").split(",")):
+            skipped[receipt_id] = detail
+    return skipped
+
+def _batch_error_message(record: dict) -> str:
+    # Client-facing: the provider's message only, never the raw record
+    error = record.get("error") or ((record.get("response") or {}).get("body") or {}).get("error") or {}
+    return error.get("message") or "Batch request failed."
+
+async def fetch_parse_batch(batch_id: str) -> BatchJob:
+    client = openai_client()
+    try:
+        batch = await client.batches.retrieve(batch_id)
+    except openai.NotFoundError:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+    job = BatchJob(batch_id=batch.id, status=batch.status, errors=_skipped_from_metadata(batch.metadata))
+    if batch.status != "completed":
+        return job
+
+    # Successful requests land in the output file, failed ones in the error file
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        output = await client.files.content(file_id)
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            receipt_id = record["custom_id"]
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                job.errors[receipt_id] = _batch_error_message(record)
+                continue
+            choices = response["body"].get("choices") or []
+            content = choices[0]["message"]["content"] if choices else None
+            try:
+                job.results[receipt_id] = _validate_items(_load_reply(content).get("items"))
+            except HTTPException as exc:
+                job.errors[receipt_id] = exc.detail
+    return job
+
 # -------------------------
 # Upload helper (async file read)
 # -------------------------
-async def _scan_from_upload(file: UploadFile) -> ParsedItems:
-    contents = await file.read()
+UPLOAD_CHUNK_SIZE = 1 << 20                                     # 1 MiB per read
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Reads an upload (already spooled by Starlette) into the contiguous bytes Vision needs,
+    rejecting it with 413 as soon as it exceeds MAX_UPLOAD_BYTES.
+    """
+    if file.size is not None:
+        # Size known up front: check it, then read once with no intermediate buffer
+        if file.size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Uploaded file is too large.")
+        contents = await file.read()
+    else:
+        buf = bytearray()
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            if len(buf) + len(chunk) > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Uploaded file is too large.")
+            buf += chunk
+        contents = bytes(buf)
     if not contents:
         raise HTTPException(status_code=400, detail="Uploaded file was empty.")
-    ocr_text = ocr_image_bytes(contents)
-    return parse_items_with_openai(ocr_text)
+    return contents
+
+
+def _check_batch_size(files: List[UploadFile]) -> None:
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many files; at most {MAX_BATCH_FILES} per request.")
+
+def _error_detail(exc: BaseException) -> str:
+    if isinstance(exc, HTTPException):
+        return str(exc.detail)
+    logger.warning("Receipt in batch failed: %r", exc)
+    return "Receipt could not be parsed."
+
+async def _scan_from_upload(file: UploadFile) -> ParsedItems:
+    contents = await read_upload(file)
+    ocr_text = await ocr_image_bytes(contents)
+    return await parse_items_with_openai(ocr_text)
 
 # -------------------------
 # Upload endpoints (required 'file' param)
@@ -165,12 +945,7 @@ async def scan(file: UploadFile = File(...), filename: str = Form(None)):
     Accepts multipart/form-data upload with field name 'file'.
     Returns parsed receipt items.
     """
-    contents = await file.read()
-    if not contents:
-        raise HTTPException(status_code=400, detail="Uploaded file was empty.")
-
-    ocr_text = ocr_image_bytes(contents)
-    return parse_items_with_openai(ocr_text)
+    return await _scan_from_upload(file)
 
 @app.post("/api/scan", response_model=ParsedItems)
 async def scan_api(file: UploadFile = File(...)):
@@ -179,3 +954,59 @@ async def scan_api(file: UploadFile = File(...)):
 @app.post("/parse", response_model=ParsedItems)
 async def parse_alias(file: UploadFile = File(...)):
     return await _scan_from_upload(file)
+
+@app.post("/scan-batch", response_model=BatchScan)
+async def scan_batch(files: List[UploadFile] = File(...)):
+    """
+    Accepts multipart/form-data upload with up to 16 'files' fields.
+    Returns parsed items keyed by the receipt's upload index; a receipt that fails
+    (e.g. not a receipt) is reported under errors without failing the others.
+    """
+    _check_batch_size(files)
+    bodies = await asyncio.gather(*(read_upload(f) for f in files))
+    ocr_texts = await ocr_images_bytes(bodies)
+    sem = asyncio.Semaphore(SCAN_BATCH_CONCURRENCY)    # keep OpenAI fan-out under rate limits
+
+    async def one(ocr_text: Union[str, HTTPException]) -> ParsedItems:
+        if isinstance(ocr_text, HTTPException):
+            raise ocr_text
+        async with sem:
+            return await parse_items_with_openai(ocr_text)
+
+    outcomes = await asyncio.gather(*(one(t) for t in ocr_texts), return_exceptions=True)
+    scan = BatchScan()
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, BaseException):
+            scan.errors[str(i)] = _error_detail(outcome)
+        else:
+            scan.results[str(i)] = outcome
+    return scan
+
+@app.post("/scan-async", response_model=BatchJob)
+async def scan_async(files: List[UploadFile] = File(...)):
+    """
+    Accepts multipart/form-data upload with one or more 'files' fields for non-interactive scans.
+    OCRs now and queues parsing on the OpenAI Batch API; poll /batch/{batch_id} for results.
+    """
+    _check_batch_size(files)
+    bodies = await asyncio.gather(*(read_upload(f) for f in files))
+    ocr_texts = await ocr_images_bytes(bodies)
+    return await submit_parse_batch(ocr_texts)
+
+@app.get("/batch/{batch_id}", response_model=BatchJob)
+async def batch_status(batch_id: str):
+    """
+    Returns the batch status; once completed, items keyed by the receipt's upload index.
+    """
+    return await fetch_parse_batch(batch_id)
+
+@app.post("/scan-stream")
+async def scan_stream(file: UploadFile = File(...)):
+    """
+    Accepts multipart/form-data upload with field name 'file'.
+    Streams parsed items as Server-Sent Events while the model is still generating.
+    """
+    contents = await read_upload(file)
+    ocr_text = await ocr_image_bytes(contents)
+    require_receipt(ocr_text)
+    return StreamingResponse(stream_item_events(ocr_text), media_type="text/event-stream")
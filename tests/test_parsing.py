@@ -0,0 +1,175 @@
+import asyncio
+import json
+import re
+
+import pytest
+from fastapi import HTTPException
+
+import main
+
+ITEM = {"name": "Bananas", "quantity": 2, "category": "Food"}
+
+
+def _fake_complete(replies_by_text, calls):
+    """Answers a coalesced prompt by mapping each RECEIPT <id> back to its OCR text."""
+    async def complete(system_prompt, user_prompt, response_format, max_tokens=main.OPENAI_MAX_TOKENS):
+        calls.append((system_prompt, user_prompt))
+        if system_prompt == main.SYSTEM_PROMPT:
+            text = user_prompt.split("OCR_TEXT:\n", 1)[1].strip()
+            return json.dumps({"items": replies_by_text[text]})
+        receipts = re.findall(r"RECEIPT (\d+):\n(.*?)\n", user_prompt)
+        return json.dumps({receipt_id: replies_by_text[text] for receipt_id, text in receipts})
+    return complete
+
+
+# -------------------------
+# Dynamic batcher
+# -------------------------
+def test_batcher_splits_coalesced_reply_to_the_right_callers(monkeypatch):
+    replies = {
+        "receipt A 3.99": [ITEM],
+        "receipt B 1.25": [{"name": "Paper Towels", "quantity": 0, "category": "Household"}],
+        "receipt C 7.50": [],
+        "receipt D 2.00": [{"name": "Milk", "quantity": 1, "category": "Food"}],
+    }
+    calls = []
+    monkeypatch.setattr(main, "_complete", _fake_complete(replies, calls))
+
+    async def scenario():
+        await main.start_parse_batcher()
+        try:
+            return await asyncio.gather(
+                *(main._parse_batched(text) for text in replies), return_exceptions=True
+            )
+        finally:
+            await main.stop_parse_batcher()
+
+    a, b, c, d = asyncio.run(scenario())
+
+    assert len(calls) == 1 and calls[0][0] == main.BATCH_SYSTEM_PROMPT
+    assert [item.model_dump() for item in a] == [ITEM]
+    assert isinstance(b, HTTPException) and b.status_code == 422     # bad item fails only its caller
+    assert isinstance(c, HTTPException) and c.status_code == 204
+    assert [item.name for item in d] == ["Milk"]
+
+
+def test_batcher_uses_single_prompt_for_a_lone_receipt(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "_complete", _fake_complete({"receipt A 3.99": [ITEM]}, calls))
+
+    async def scenario():
+        await main.start_parse_batcher()
+        try:
+            return await main._parse_batched("receipt A 3.99")
+        finally:
+            await main.stop_parse_batcher()
+
+    items = asyncio.run(scenario())
+
+    assert [item.model_dump() for item in items] == [ITEM]
+    assert len(calls) == 1 and calls[0][0] == main.SYSTEM_PROMPT
+
+
+def test_batch_call_failure_reaches_every_caller(monkeypatch):
+    async def complete(*args, **kwargs):
+        raise HTTPException(status_code=502, detail="Model did not return valid JSON.")
+    monkeypatch.setattr(main, "_complete", complete)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        batch = [("one 1.00", loop.create_future()), ("two 2.00", loop.create_future())]
+        await main._dispatch_parse_batch(batch)
+        return [fut.exception() for _, fut in batch]
+
+    errors = asyncio.run(scenario())
+
+    assert all(isinstance(exc, HTTPException) and exc.status_code == 502 for exc in errors)
+
+
+# -------------------------
+# Streaming item parser
+# -------------------------
+STREAMED_ITEMS = [
+    {"name": 'Cereal {Family} "Size"', "quantity": 1, "category": "Food"},
+    {"name": "Foil [18in] \\ roll", "quantity": 3, "category": "Household"},
+    {"name": "}{][", "quantity": 2, "category": "Food"},
+]
+
+
+def _feed_all(parser, chunks):
+    out = []
+    for chunk in chunks:
+        out += parser.feed(chunk)
+    return [json.loads(raw) for raw in out]
+
+
+def test_stream_parser_ignores_braces_and_quotes_inside_names():
+    reply = json.dumps({"items": STREAMED_ITEMS})
+    assert _feed_all(main._ItemStreamParser(), [reply]) == STREAMED_ITEMS
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64])
+def test_stream_parser_handles_input_split_across_chunks(size):
+    reply = json.dumps({"items": STREAMED_ITEMS})
+    chunks = [reply[i : i + size] for i in range(0, len(reply), size)]
+    assert _feed_all(main._ItemStreamParser(), chunks) == STREAMED_ITEMS
+
+
+def test_stream_parser_emits_each_item_as_soon_as_it_closes():
+    parser = main._ItemStreamParser()
+    assert parser.feed('{"items": [{"name": "A", "quantity": 1, "category": "Food"}') != []
+    assert parser.feed(', {"name": "B", "quan') == []
+    assert json.loads(parser.feed('tity": 1, "category": "Food"}]}')[0])["name"] == "B"
+
+
+# -------------------------
+# Receipt gate
+# -------------------------
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("", False),
+        ("   \n  ", False),
+        ("MILK 3.99 EGGS 2.1", False),              # 18 chars after strip: too short
+        ("MILK 3.99 EGGS 2.10", False),             # 19 chars
+        ("MILK 3.99 EGGS 2.10 ", False),            # trailing space doesn't count
+        ("MILK 3.99  EGGS 2.10", True),             # 20 chars, 6 digits, price
+        ("ITEM 1.23 ITEM ABCDEF", False),           # 3 digits
+        ("ITEM 1.23 ITEM 4 ABCD", False),           # 4 digits
+        ("ITEM 1.23 ITEM 45 ABC", True),            # 5 digits
+        ("ORDER 12345 THANK YOU", False),           # digits but no price or currency
+        ("ORDER 12345 TOTAL $ 7", True),            # currency symbol
+        ("ARTIKEL 12345 SUMME 3,50", True),         # comma decimal
+    ],
+)
+def test_is_probably_receipt_boundaries(text, expected):
+    assert main.is_probably_receipt(text) is expected
+
+
+def test_non_receipt_skips_the_llm(monkeypatch):
+    async def complete(*args, **kwargs):
+        raise AssertionError("LLM must not be called")
+    monkeypatch.setattr(main, "_complete", complete)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(main.parse_items_with_openai("blank photo"))
+    assert exc_info.value.status_code == 422
+
+
+# -------------------------
+# Cache codec
+# -------------------------
+def test_encode_decode_items_round_trip():
+    items = main.PARSED_ITEMS_ADAPTER.validate_python([
+        ITEM,
+        {"name": "Détergent „Ultra“ 2×", "quantity": 12, "category": "Household"},
+    ])
+    blob = main._encode_items(items)
+
+    assert isinstance(blob, bytes)
+    assert main._decode_items(blob) == items
+    assert b"quantity" not in blob                    # rows, not per-item field names
+
+
+def test_encode_decode_empty_list():
+    assert main._decode_items(main._encode_items([])) == []